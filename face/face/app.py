@@ -7,17 +7,69 @@ import os
 from datetime import datetime, timedelta
 import json
 import base64
+import functools
+import socket
+import threading
 from collections import defaultdict
+from werkzeug.utils import secure_filename
+from gallery import (
+    build_gallery, build_subject_index, match_face,
+    append_to_gallery, remove_from_gallery, find_row
+)
+import video_jobs
+from attendance_cache import (
+    load_daily_file, file_signature,
+    cached_response, invalidate_responses, get_cache_stats
+)
+import attendance_history
+from attendance_marks import record_marks
+import change_feed
+import frame_pacing
 
 app = Flask(__name__)
 
 # Create necessary directories
 os.makedirs('known_faces', exist_ok=True)
 os.makedirs('attendance_records', exist_ok=True)
+os.makedirs('uploaded_videos', exist_ok=True)
 
 # Global variables
-known_face_encodings = []
 known_face_names = []
+known_face_matrix = build_gallery([])
+subject_gallery_index = {}
+
+# Gallery storage: 'float64' (exact), or compact 'float16' / 'int8' for
+# memory-bound deployments running many worker processes
+GALLERY_MODE = os.environ.get('GALLERY_MODE', 'float64')
+
+# Fall back to the full gallery when a face is not in the subject's roster
+GALLERY_FALLBACK = True
+
+# Guards swapping the gallery globals so readers see a consistent snapshot
+gallery_lock = threading.RLock()
+
+# Serializes writes to the daily attendance files and student records from
+# requests, video jobs and the change-feed follower
+attendance_lock = threading.RLock()
+
+# Process every Nth frame of uploaded videos unless the upload says otherwise
+DEFAULT_VIDEO_STRIDE = 15
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# Closed terms converted with attendance_history.py; days covered here are
+# answered from the columnar history instead of the daily JSON files
+HISTORY_DIR = 'attendance_history'
+attendance_term_history = None
+
+# SQLite change-feed for running several app instances on one host, e.g.
+# behind a local load balancer; when unset the app runs as a single node.
+# Each instance keeps its own data directory and only the feed file, on a
+# local disk, is shared. NODE_ID must stay the same across restarts so a
+# node skips its own changes when replaying the feed.
+CHANGE_FEED_PATH = os.environ.get('CHANGE_FEED')
+CHANGE_FEED_CHECKPOINT = 'change_feed_seq'
+NODE_ID = os.environ.get('NODE_ID') or f'{socket.gethostname()}:{os.getcwd()}'
+change_feed_follower = None
 
 # Available subjects
 SUBJECTS = [
@@ -132,6 +184,7 @@ def save_teachers():
         print("Teachers saved successfully")
     except Exception as e:
         print(f"Error saving teachers: {e}")
+    invalidate_responses()
 
 def load_students():
     """Load students from file"""
@@ -145,6 +198,8 @@ def load_students():
                 print(f"Loaded {len(loaded_students)} students from file")
         except Exception as e:
             print(f"Error loading students: {e}")
+    
+    build_subject_galleries()
 
 def save_students():
     """Save students to file"""
@@ -155,6 +210,7 @@ def save_students():
         print("Students saved successfully")
     except Exception as e:
         print(f"Error saving students: {e}")
+    invalidate_responses()
 
 def load_attendance():
     """Load attendance records from file"""
@@ -178,12 +234,13 @@ def save_attendance():
         print("Attendance saved successfully")
     except Exception as e:
         print(f"Error saving attendance: {e}")
+    invalidate_responses()
 
 def load_known_faces():
     """Load all registered faces from the known_faces directory"""
-    global known_face_encodings, known_face_names
-    known_face_encodings = []
-    known_face_names = []
+    global known_face_names, known_face_matrix
+    face_encodings = []
+    face_names = []
     
     for filename in os.listdir('known_faces'):
         if filename.endswith(('.jpg', '.jpeg', '.png')):
@@ -193,10 +250,91 @@ def load_known_faces():
             encodings = face_recognition.face_encodings(image)
             
             if encodings:
-                known_face_encodings.append(encodings[0])
-                known_face_names.append(name)
+                face_encodings.append(encodings[0])
+                face_names.append(name)
+    
+    gallery = build_gallery(face_encodings, GALLERY_MODE)
+    
+    with gallery_lock:
+        known_face_matrix = gallery
+        
+        # The stacked matrix is the only copy of the encodings and this is
+        # the only copy of the names; compact mode keeps them in a flat
+        # array instead of a list
+        if GALLERY_MODE == 'float64':
+            known_face_names = face_names
+        else:
+            known_face_names = np.array(face_names, dtype=str)
+        
+        build_subject_galleries()
+    
+    print(f"Loaded {len(known_face_names)} known faces ({GALLERY_MODE} gallery)")
+    invalidate_responses()
+
+def add_known_face(name, encoding):
+    """Add or replace one face in the gallery without reloading every image"""
+    global known_face_names, known_face_matrix
+    with gallery_lock:
+        remove_known_face(name)
+        
+        known_face_matrix = append_to_gallery(known_face_matrix, encoding)
+        if GALLERY_MODE == 'float64':
+            known_face_names = known_face_names + [name]
+        else:
+            known_face_names = np.append(known_face_names, name)
+        
+        build_subject_galleries()
+    invalidate_responses()
+
+def remove_known_face(name):
+    """Remove one face from the gallery if it is present"""
+    global known_face_names, known_face_matrix
+    with gallery_lock:
+        row = find_row(known_face_names, name)
+        if row is None:
+            return
+        
+        known_face_matrix = remove_from_gallery(known_face_matrix, row)
+        if GALLERY_MODE == 'float64':
+            known_face_names = known_face_names[:row] + known_face_names[row + 1:]
+        else:
+            known_face_names = np.delete(known_face_names, row)
+        
+        build_subject_galleries()
+    invalidate_responses()
+
+def registered_faces():
+    """Ids currently in the gallery; marks for anyone else are not counted"""
+    with gallery_lock:
+        return {str(name) for name in known_face_names}
+
+def build_subject_galleries():
+    """Rebuild the per-subject roster views of the gallery"""
+    global subject_gallery_index
+    with gallery_lock:
+        subject_gallery_index = build_subject_index(known_face_names, get_enrollments(), SUBJECTS)
+
+def get_enrollments():
+    """Subjects each student is enrolled in, for students that recorded them
     
-    print(f"Loaded {len(known_face_names)} known faces")
+    Students registered without a subject list are left out of every roster
+    view and are only found through the full-gallery fallback.
+    """
+    return {
+        student_id: student['subjects']
+        for student_id, student in list(STUDENTS.items())
+        if 'subjects' in student
+    }
+
+def load_term_history():
+    """Open the columnar attendance history if one has been converted"""
+    global attendance_term_history
+    if os.path.exists(os.path.join(HISTORY_DIR, 'records.npy')):
+        try:
+            attendance_term_history = attendance_history.load_history(HISTORY_DIR)
+            print(f"Loaded attendance history for {len(attendance_term_history['days'])} days")
+        except Exception as e:
+            print(f"Error loading attendance history: {e}")
 
 def get_all_registered_students():
     """Get all students who have registered faces"""
@@ -228,25 +366,46 @@ def get_all_attendance_dates():
             dates.append(date_str)
     return sorted(dates)
 
-def get_absent_dates_for_student(student_id, subject):
-    """Get all dates when a student was absent for a specific subject"""
-    absent_dates = []
-    all_dates = get_all_attendance_dates()
+def load_attendance_days():
+    """Parsed daily files not covered by the term history, oldest first"""
+    history_dates = set()
+    if attendance_term_history is not None:
+        history_dates = attendance_term_history['dates']
     
-    for date in all_dates:
+    attendance_days = []
+    for date in get_all_attendance_dates():
+        if date in history_dates:
+            continue
+        
         attendance_file = f'attendance_records/attendance_{date}.json'
         if os.path.exists(attendance_file):
-            with open(attendance_file, 'r') as f:
-                attendance_data = json.load(f)
-                
-            # Check if student was absent (not in attendance or subject not marked)
-            if student_id not in attendance_data:
-                absent_dates.append(date)
-            elif isinstance(attendance_data[student_id], dict):
-                if subject not in attendance_data[student_id]:
-                    absent_dates.append(date)
+            attendance_days.append((date, load_daily_file(attendance_file)))
     
-    return absent_dates
+    return attendance_days
+
+def get_absent_dates_for_student(student_id, subject, attendance_days=None):
+    """Get all dates when a student was absent for a specific subject
+    
+    Callers looping over many students or subjects should pass the result
+    of load_attendance_days() so each day is looked up once per request.
+    """
+    absent_dates = []
+    
+    if attendance_term_history is not None:
+        absent_dates = attendance_history.absent_dates(attendance_term_history, student_id, subject)
+    
+    if attendance_days is None:
+        attendance_days = load_attendance_days()
+    
+    for date, attendance_data in attendance_days:
+        # Check if student was absent (not in attendance or subject not marked);
+        # the rule is shared with the history so both paths agree
+        if student_id not in attendance_data:
+            absent_dates.append(date)
+        elif not attendance_history.is_marked(attendance_data[student_id], subject):
+            absent_dates.append(date)
+    
+    return sorted(absent_dates)
 
 def mark_attendance(name, subject):
     """Mark attendance for a recognized person in a specific subject"""
@@ -254,35 +413,199 @@ def mark_attendance(name, subject):
     current_time = datetime.now().strftime('%H:%M:%S')
     
     attendance_file = f'attendance_records/attendance_{today}.json'
-    attendance_data = {}
     
-    if os.path.exists(attendance_file):
-        with open(attendance_file, 'r') as f:
-            attendance_data = json.load(f)
+    with attendance_lock:
+        updated, newly_marked = record_marks(
+            attendance_file, subject, {name: current_time}, STUDENT_ATTENDANCE, registered_faces()
+        )
+        
+        if newly_marked:
+            save_attendance()
+        else:
+            marked_time = load_daily_file(attendance_file)[name][subject]
+    
+    if updated:
+        publish_change('mark_attendance', {'subject': subject, 'date': today, 'marks': updated})
+    
+    if not newly_marked:
+        return False, marked_time
     
-    if name not in attendance_data or not isinstance(attendance_data[name], dict):
-        attendance_data[name] = {}
+    return True, current_time
+
+def mark_attendance_bulk(marks, subject, date):
+    """Mark attendance for many students at once with a single file write
     
-    if subject in attendance_data[name]:
-        return False, attendance_data[name][subject]
+    marks maps student_id to the 'HH:MM:SS' time to record. Returns the
+    student ids that were newly marked.
+    """
+    attendance_file = f'attendance_records/attendance_{date}.json'
     
-    attendance_data[name][subject] = current_time
+    with attendance_lock:
+        updated, newly_marked = record_marks(
+            attendance_file, subject, marks, STUDENT_ATTENDANCE, registered_faces()
+        )
+        
+        if newly_marked:
+            save_attendance()
     
-    with open(attendance_file, 'w') as f:
-        json.dump(attendance_data, f, indent=4)
+    # Earlier times for students already marked are shared too, so every
+    # instance keeps the same time for each mark
+    if updated:
+        publish_change('mark_attendance', {'subject': subject, 'date': date, 'marks': updated})
     
-    if name not in STUDENT_ATTENDANCE:
-        STUDENT_ATTENDANCE[name] = {}
+    return newly_marked
+
+def recognize_faces_in_image(rgb_image, subject):
+    """Detect, encode and match faces in an RGB image
     
-    if subject not in STUDENT_ATTENDANCE[name]:
-        STUDENT_ATTENDANCE[name][subject] = {'present': 0, 'total': 0}
+    Returns a list of (student_id, location) pairs; student_id is None for
+    faces that did not match anyone in the gallery.
+    """
+    face_locations = face_recognition.face_locations(rgb_image, model='hog')
+    face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
     
-    STUDENT_ATTENDANCE[name][subject]['present'] += 1
-    STUDENT_ATTENDANCE[name][subject]['total'] += 1
+    with gallery_lock:
+        gallery = known_face_matrix
+        gallery_names = known_face_names
+        roster_rows = subject_gallery_index.get(subject)
     
-    save_attendance()
+    matched = []
     
-    return True, current_time
+    for face_encoding, face_location in zip(face_encodings, face_locations):
+        best_match_index, _ = match_face(
+            gallery, face_encoding, roster_rows,
+            fallback=GALLERY_FALLBACK, tolerance=0.5
+        )
+        
+        if best_match_index is not None:
+            matched.append((str(gallery_names[best_match_index]), face_location))
+        else:
+            matched.append((None, face_location))
+    
+    return matched
+
+def publish_change(kind, payload):
+    """Publish a change for the other app instances to apply"""
+    if not CHANGE_FEED_PATH:
+        return
+    try:
+        change_feed.publish(CHANGE_FEED_PATH, NODE_ID, kind, payload)
+    except Exception as e:
+        print(f"Error publishing change {kind}: {e}")
+
+def apply_change(event):
+    """Apply a change published by another app instance"""
+    kind = event['kind']
+    payload = event['payload']
+    
+    if kind == 'register_face':
+        apply_face_registration(payload)
+    elif kind == 'delete_student':
+        apply_student_deletion(payload['student_id'])
+    elif kind == 'register_teacher':
+        with attendance_lock:
+            TEACHERS[payload['teacher_id']] = payload['teacher']
+            save_teachers()
+    elif kind == 'update_password':
+        with attendance_lock:
+            if payload['user_type'] == 'student' and payload['user_id'] in STUDENTS:
+                STUDENTS[payload['user_id']]['password'] = payload['password']
+                save_students()
+            elif payload['user_type'] == 'teacher' and payload['user_id'] in TEACHERS:
+                TEACHERS[payload['user_id']]['password'] = payload['password']
+                save_teachers()
+    elif kind == 'mark_attendance':
+        apply_attendance_marks(payload['subject'], payload['date'], payload['marks'])
+    else:
+        print(f"Ignoring unknown change: {kind}")
+
+def apply_face_registration(payload):
+    """Add a face (and student record) registered on another instance"""
+    user_id = payload['user_id']
+    
+    image_path = os.path.join('known_faces', f'{user_id}.jpg')
+    if not os.path.exists(image_path):
+        with open(image_path, 'wb') as f:
+            f.write(base64.b64decode(payload['image']))
+    
+    with attendance_lock:
+        if payload.get('student') is not None:
+            STUDENTS[user_id] = payload['student']
+            save_students()
+            
+            if user_id not in STUDENT_ATTENDANCE:
+                enrolled_subjects = payload['student'].get('subjects') or SUBJECTS
+                STUDENT_ATTENDANCE[user_id] = {subject: {'present': 0, 'total': 0} for subject in enrolled_subjects}
+                save_attendance()
+        
+        add_known_face(user_id, np.array(payload['encoding']))
+
+def apply_student_deletion(student_id):
+    """Remove a student deleted on another instance"""
+    image_path = os.path.join('known_faces', f'{student_id}.jpg')
+    if os.path.exists(image_path):
+        os.remove(image_path)
+    
+    with attendance_lock:
+        if student_id in STUDENTS:
+            del STUDENTS[student_id]
+            save_students()
+        
+        if student_id in STUDENT_ATTENDANCE:
+            del STUDENT_ATTENDANCE[student_id]
+            save_attendance()
+        
+        remove_known_face(student_id)
+
+def apply_attendance_marks(subject, date, marks):
+    """Apply attendance marks made on another instance
+    
+    record_marks only counts students this node has not already marked for
+    the subject that day, so marks this node made itself, or received
+    before a replay, are not counted twice. Marks for students this node
+    has already deleted go in the daily file but are not counted, as if
+    the mark had arrived before the deletion.
+    """
+    attendance_file = f'attendance_records/attendance_{date}.json'
+    
+    with attendance_lock:
+        _, newly_marked = record_marks(
+            attendance_file, subject, marks, STUDENT_ATTENDANCE, registered_faces()
+        )
+        
+        if newly_marked:
+            save_attendance()
+
+def start_change_feed():
+    """Follow the change-feed from this node's saved checkpoint"""
+    global change_feed_follower
+    if not CHANGE_FEED_PATH:
+        return
+    
+    # Every change is safe to apply twice, so events between the last saved
+    # checkpoint and a crash are simply replayed. A new node starts from #0.
+    change_feed.init_feed(CHANGE_FEED_PATH)
+    seq = change_feed.load_checkpoint(CHANGE_FEED_CHECKPOINT)
+    change_feed_follower = change_feed.start_follower(
+        CHANGE_FEED_PATH, NODE_ID, apply_change,
+        from_seq=seq, checkpoint_path=CHANGE_FEED_CHECKPOINT
+    )
+    print(f"Following change feed {CHANGE_FEED_PATH} from #{seq} as {NODE_ID}")
+
+def paced(view):
+    """Time a recognition endpoint and attach pacing hints to its JSON response"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        started = frame_pacing.frame_started()
+        try:
+            response = view(*args, **kwargs)
+        finally:
+            frame_pacing.frame_finished(started)
+        
+        payload = response.get_json()
+        payload['pacing'] = frame_pacing.pacing_hints()
+        return jsonify(payload)
+    return wrapper
 
 # Routes
 @app.route('/')
@@ -329,6 +652,7 @@ def register_face():
         password = data.get('password', '').strip()
         security_question = data.get('security_question', '').strip()
         security_answer = data.get('security_answer', '').strip().lower()
+        enrolled_subjects = data.get('subjects') or []
         image_data = data.get('image')
         
         if not name or not image_data:
@@ -346,6 +670,9 @@ def register_face():
         if not security_question or not security_answer:
             return jsonify({'success': False, 'message': 'Security question and answer are required'})
         
+        if any(subject not in SUBJECTS for subject in enrolled_subjects):
+            return jsonify({'success': False, 'message': 'Invalid subject selected'})
+        
         user_id = name.lower().replace(' ', '_')
         
         if user_type == 'student' and user_id in STUDENTS:
@@ -367,28 +694,40 @@ def register_face():
         if len(face_locations) > 1:
             return jsonify({'success': False, 'message': 'Multiple faces detected. Please ensure only one face is visible'})
         
+        face_encoding = face_recognition.face_encodings(rgb_image, face_locations)[0]
+        
         # Save image
         image_path = os.path.join('known_faces', f'{user_id}.jpg')
         cv2.imwrite(image_path, image)
         
         # Add to database
         if user_type == 'student':
-            STUDENTS[user_id] = {
-                'name': name,
-                'usn': usn,
-                'password': password,
-                'security_question': security_question,
-                'security_answer': security_answer
-            }
-            save_students()
-            
-            STUDENT_ATTENDANCE[user_id] = {}
-            for subject in SUBJECTS:
-                STUDENT_ATTENDANCE[user_id][subject] = {'present': 0, 'total': 0}
-            save_attendance()
+            with attendance_lock:
+                STUDENTS[user_id] = {
+                    'name': name,
+                    'usn': usn,
+                    'password': password,
+                    'security_question': security_question,
+                    'security_answer': security_answer
+                }
+                if enrolled_subjects:
+                    STUDENTS[user_id]['subjects'] = enrolled_subjects
+                save_students()
+                
+                STUDENT_ATTENDANCE[user_id] = {}
+                for subject in enrolled_subjects or SUBJECTS:
+                    STUDENT_ATTENDANCE[user_id][subject] = {'present': 0, 'total': 0}
+                save_attendance()
         
         load_known_faces()
         
+        publish_change('register_face', {
+            'user_id': user_id,
+            'student': STUDENTS[user_id] if user_type == 'student' else None,
+            'image': base64.b64encode(cv2.imencode('.jpg', image)[1].tobytes()).decode('ascii'),
+            'encoding': face_encoding.tolist()
+        })
+        
         return jsonify({'success': True, 'message': f'Successfully registered {name}'})
     
     except Exception as e:
@@ -432,6 +771,8 @@ def register_teacher():
         
         save_teachers()
         
+        publish_change('register_teacher', {'teacher_id': teacher_id, 'teacher': TEACHERS[teacher_id]})
+        
         return jsonify({
             'success': True, 
             'message': f'Successfully registered teacher: {name} for {subject}'
@@ -441,6 +782,7 @@ def register_teacher():
         return jsonify({'success': False, 'message': f'Registration error: {str(e)}'})
 
 @app.route('/api/recognize_face', methods=['POST'])
+@paced
 def recognize_face():
     """Recognize face and mark attendance for specific subject"""
     try:
@@ -464,56 +806,35 @@ def recognize_face():
         image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
-        # Find faces in the image
-        face_locations = face_recognition.face_locations(rgb_image, model='hog')
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        # Find and match faces in the image
+        matched_faces = recognize_faces_in_image(rgb_image, subject)
         
-        if len(face_encodings) == 0:
+        if len(matched_faces) == 0:
             return jsonify({'success': False, 'message': 'No face detected'})
         
         recognized_faces = []
         
-        for face_encoding, face_location in zip(face_encodings, face_locations):
-            matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=0.5)
-            name = "Unknown"
-            
-            face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-            
+        for name, face_location in matched_faces:
             top, right, bottom, left = face_location
             
-            if len(face_distances) > 0:
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index] and face_distances[best_match_index] < 0.5:
-                    name = known_face_names[best_match_index]
-                    
-                    was_marked, attendance_time = mark_attendance(name, subject)
-                    
-                    student_name = STUDENTS.get(name, {}).get('name', name)
-                    
-                    recognized_faces.append({
-                        'name': student_name,
-                        'student_id': name,
-                        'subject': subject,
-                        'attendance_marked': was_marked,
-                        'time': attendance_time,
-                        'location': {
-                            'top': int(top),
-                            'right': int(right),
-                            'bottom': int(bottom),
-                            'left': int(left)
-                        }
-                    })
-                else:
-                    recognized_faces.append({
-                        'name': 'Unknown',
-                        'attendance_marked': False,
-                        'location': {
-                            'top': int(top),
-                            'right': int(right),
-                            'bottom': int(bottom),
-                            'left': int(left)
-                        }
-                    })
+            if name is not None:
+                was_marked, attendance_time = mark_attendance(name, subject)
+                
+                student_name = STUDENTS.get(name, {}).get('name', name)
+                
+                recognized_faces.append({
+                    'name': student_name,
+                    'student_id': name,
+                    'subject': subject,
+                    'attendance_marked': was_marked,
+                    'time': attendance_time,
+                    'location': {
+                        'top': int(top),
+                        'right': int(right),
+                        'bottom': int(bottom),
+                        'left': int(left)
+                    }
+                })
             else:
                 recognized_faces.append({
                     'name': 'Unknown',
@@ -535,6 +856,76 @@ def recognize_face():
         print(f"Error in recognize_face: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/video_jobs', methods=['POST'])
+def create_video_job():
+    """Upload a recorded lecture and recognize attendance from it in the background"""
+    try:
+        video = request.files.get('video')
+        subject = request.form.get('subject', '').strip()
+        stride = request.form.get('stride', DEFAULT_VIDEO_STRIDE)
+        date = request.form.get('date', '').strip() or datetime.now().strftime('%Y-%m-%d')
+        start_time = request.form.get('start_time', '').strip()
+        
+        if video is None or not video.filename:
+            return jsonify({'success': False, 'message': 'Video file is required'})
+        
+        if not video.filename.lower().endswith(VIDEO_EXTENSIONS):
+            return jsonify({'success': False, 'message': 'Unsupported video format'})
+        
+        if not subject:
+            return jsonify({'success': False, 'message': 'Subject is required'})
+        
+        if subject not in SUBJECTS:
+            return jsonify({'success': False, 'message': 'Invalid subject selected'})
+        
+        try:
+            stride = int(stride)
+            datetime.strptime(date, '%Y-%m-%d')
+            lecture_start = datetime.strptime(f'{date} {start_time}', '%Y-%m-%d %H:%M:%S') if start_time else None
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid stride, date or start time'})
+        
+        if stride < 1:
+            return jsonify({'success': False, 'message': 'Stride must be at least 1'})
+        
+        video_path = os.path.join('uploaded_videos', f'{datetime.now().strftime("%Y%m%d%H%M%S%f")}_{secure_filename(video.filename)}')
+        video.save(video_path)
+        
+        def recognize_frame(rgb_image):
+            return [name for name, _ in recognize_faces_in_image(rgb_image, subject) if name is not None]
+        
+        def on_complete(first_seen):
+            # Use the lecture start plus the offset into the video when known
+            if lecture_start is not None:
+                marks = {name: (lecture_start + timedelta(seconds=offset)).strftime('%H:%M:%S')
+                         for name, offset in first_seen.items()}
+            else:
+                now = datetime.now().strftime('%H:%M:%S')
+                marks = {name: now for name in first_seen}
+            return mark_attendance_bulk(marks, subject, date)
+        
+        job_id = video_jobs.create_job(video_path, subject, stride, recognize_frame, on_complete)
+        
+        return jsonify({'success': True, 'job_id': job_id})
+    
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/api/video_jobs/<job_id>')
+def get_video_job(job_id):
+    """Poll the progress and results of a video job"""
+    job = video_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'})
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/video_jobs/<job_id>/cancel', methods=['POST'])
+def cancel_video_job(job_id):
+    """Cancel a running video job"""
+    if not video_jobs.cancel_job(job_id):
+        return jsonify({'success': False, 'message': 'Job not found, already finished or already marking attendance'})
+    return jsonify({'success': True, 'message': 'Cancellation requested'})
+
 @app.route('/api/get_registered_users')
 def get_registered_users():
     """Get list of all registered users"""
@@ -551,19 +942,23 @@ def get_attendance():
         today = datetime.now().strftime('%Y-%m-%d')
         attendance_file = f'attendance_records/attendance_{today}.json'
         
-        attendance_data = {}
-        if os.path.exists(attendance_file):
-            with open(attendance_file, 'r') as f:
-                attendance_data = json.load(f)
+        def build():
+            return jsonify({
+                'success': True,
+                'date': today,
+                'attendance': load_daily_file(attendance_file)
+            }).get_data()
         
-        return jsonify({
-            'success': True,
-            'date': today,
-            'attendance': attendance_data
-        })
+        body = cached_response(('get_attendance', today, file_signature(attendance_file)), build)
+        return app.response_class(body, mimetype='application/json')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/cache_stats')
+def cache_stats():
+    """Hit/miss counters for the attendance file and response caches"""
+    return jsonify({'success': True, 'stats': get_cache_stats()})
+
 @app.route('/api/student_login', methods=['POST'])
 def student_login():
     """Student login"""
@@ -623,6 +1018,7 @@ def get_student_attendance(student_id):
             return jsonify({'success': False, 'message': 'Student not found'})
         
         attendance = STUDENT_ATTENDANCE[student_id]
+        attendance_days = load_attendance_days()
         subjects = []
         total_present = 0
         total_classes = 0
@@ -633,7 +1029,7 @@ def get_student_attendance(student_id):
             percentage = (present / total * 100) if total > 0 else 0
             
             # Get absent dates for this subject
-            absent_dates = get_absent_dates_for_student(student_id, subject)
+            absent_dates = get_absent_dates_for_student(student_id, subject, attendance_days)
             absent_count = len(absent_dates)
             
             subjects.append({
@@ -670,54 +1066,56 @@ def get_teacher_subject_attendance(teacher_id):
         today = datetime.now().strftime('%Y-%m-%d')
         attendance_file = f'attendance_records/attendance_{today}.json'
         
-        today_attendance = {}
-        if os.path.exists(attendance_file):
-            with open(attendance_file, 'r') as f:
-                today_attendance = json.load(f)
-        
-        students = []
-        for student_id in get_all_registered_students():
-            if student_id in STUDENT_ATTENDANCE and subject in STUDENT_ATTENDANCE[student_id]:
-                student_info = STUDENTS.get(student_id, {'name': student_id, 'usn': 'N/A'})
-                data = STUDENT_ATTENDANCE[student_id][subject]
-                
-                present = data.get('present', 0)
-                total = data.get('total', 0)
-                percentage = (present / total * 100) if total > 0 else 0
-                
-                today_time = None
-                if student_id in today_attendance and isinstance(today_attendance[student_id], dict):
-                    today_time = today_attendance[student_id].get(subject)
-                
-                # Get absent dates for this subject
-                absent_dates = get_absent_dates_for_student(student_id, subject)
-                absent_count = len(absent_dates)
-                
-                students.append({
-                    'id': student_id,
-                    'name': student_info['name'],
-                    'usn': student_info['usn'],
-                    'present': present,
-                    'total': total,
-                    'percentage': round(percentage, 1),
-                    'today_time': today_time,
-                    'absent_count': absent_count,
-                    'absent_dates': absent_dates
-                })
-        
-        present_today = sum(1 for s in students if s['today_time'] is not None)
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'subject': subject,
-                'students': students,
-                'stats': {
-                    'total_students': len(students),
-                    'present_today': present_today
+        def build():
+            today_attendance = load_daily_file(attendance_file)
+            attendance_days = load_attendance_days()
+            
+            students = []
+            for student_id in get_all_registered_students():
+                if student_id in STUDENT_ATTENDANCE and subject in STUDENT_ATTENDANCE[student_id]:
+                    student_info = STUDENTS.get(student_id, {'name': student_id, 'usn': 'N/A'})
+                    data = STUDENT_ATTENDANCE[student_id][subject]
+                    
+                    present = data.get('present', 0)
+                    total = data.get('total', 0)
+                    percentage = (present / total * 100) if total > 0 else 0
+                    
+                    today_time = None
+                    if student_id in today_attendance and isinstance(today_attendance[student_id], dict):
+                        today_time = today_attendance[student_id].get(subject)
+                    
+                    # Get absent dates for this subject
+                    absent_dates = get_absent_dates_for_student(student_id, subject, attendance_days)
+                    absent_count = len(absent_dates)
+                    
+                    students.append({
+                        'id': student_id,
+                        'name': student_info['name'],
+                        'usn': student_info['usn'],
+                        'present': present,
+                        'total': total,
+                        'percentage': round(percentage, 1),
+                        'today_time': today_time,
+                        'absent_count': absent_count,
+                        'absent_dates': absent_dates
+                    })
+            
+            present_today = sum(1 for s in students if s['today_time'] is not None)
+            
+            return jsonify({
+                'success': True,
+                'data': {
+                    'subject': subject,
+                    'students': students,
+                    'stats': {
+                        'total_students': len(students),
+                        'present_today': present_today
+                    }
                 }
-            }
-        })
+            }).get_data()
+        
+        key = ('teacher_subject_attendance', teacher_id, today, file_signature(attendance_file))
+        return app.response_class(cached_response(key, build), mimetype='application/json')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -730,18 +1128,22 @@ def delete_student(student_id):
         if os.path.exists(image_path):
             os.remove(image_path)
         
-        # Remove from STUDENTS
-        if student_id in STUDENTS:
-            del STUDENTS[student_id]
-            save_students()
-        
-        # Remove from STUDENT_ATTENDANCE
-        if student_id in STUDENT_ATTENDANCE:
-            del STUDENT_ATTENDANCE[student_id]
-            save_attendance()
+        with attendance_lock:
+            # Remove from STUDENTS
+            if student_id in STUDENTS:
+                del STUDENTS[student_id]
+                save_students()
+            
+            # Remove from STUDENT_ATTENDANCE
+            if student_id in STUDENT_ATTENDANCE:
+                del STUDENT_ATTENDANCE[student_id]
+                save_attendance()
+            
+            # Remove from the gallery in the same step, so a mark applied
+            # from the change-feed cannot count the student in between
+            remove_known_face(student_id)
         
-        # Reload faces
-        load_known_faces()
+        publish_change('delete_student', {'student_id': student_id})
         
         return jsonify({
             'success': True,
@@ -802,6 +1204,7 @@ def verify_security_answer():
                 if student['security_answer'] == security_answer:
                     STUDENTS[identifier]['password'] = new_password
                     save_students()
+                    publish_change('update_password', {'user_type': 'student', 'user_id': identifier, 'password': new_password})
                     return jsonify({'success': True, 'message': 'Password reset successful'})
         elif user_type == 'teacher':
             if identifier in TEACHERS:
@@ -809,6 +1212,7 @@ def verify_security_answer():
                 if teacher['security_answer'] == security_answer:
                     TEACHERS[identifier]['password'] = new_password
                     save_teachers()
+                    publish_change('update_password', {'user_type': 'teacher', 'user_id': identifier, 'password': new_password})
                     return jsonify({'success': True, 'message': 'Password reset successful'})
         
         return jsonify({'success': False, 'message': 'Incorrect security answer'})
@@ -820,4 +1224,11 @@ if __name__ == '__main__':
     load_teachers()
     load_students()
     load_attendance()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    load_term_history()
+    
+    # The debug reloader runs this block in a watcher process too; only the
+    # serving child should follow the change-feed
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_change_feed()
+    
+    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
\ No newline at end of file
@@ -0,0 +1,148 @@
+# attendance_cache.py - LRU caches for daily attendance files and API responses
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# Bounds for parsed daily files. Absent-date queries scan every day in
+# order, so the count cap is above a year of daily files; a smaller cap
+# would evict each file just before the next scan reuses it. Memory is the
+# estimated size of the parsed dicts, not the on-disk JSON, which is
+# several times smaller.
+MAX_CACHED_FILES = 400
+MAX_CACHED_BYTES = 64 * 1024 * 1024
+
+# Bound for serialized API responses
+MAX_CACHED_RESPONSES = 256
+
+CACHE_STATS = {
+    'file_hits': 0,
+    'file_misses': 0,
+    'file_evictions': 0,
+    'response_hits': 0,
+    'response_misses': 0
+}
+
+_files = OrderedDict()      # path -> (signature, data, estimated bytes)
+_files_bytes = 0
+_responses = OrderedDict()  # key -> serialized body
+_generation = 0
+_lock = threading.RLock()
+
+
+def file_signature(path):
+    """Return (mtime_ns, size) for a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_daily_file(path):
+    """Return the parsed contents of a daily attendance file ({} if missing).
+
+    The returned dict is shared with the cache and must not be mutated;
+    copy it before making changes and save with write_daily_file.
+    """
+    signature = file_signature(path)
+    if signature is None:
+        return {}
+
+    with _lock:
+        entry = _files.get(path)
+        if entry is not None and entry[0] == signature:
+            _files.move_to_end(path)
+            CACHE_STATS['file_hits'] += 1
+            return entry[1]
+        CACHE_STATS['file_misses'] += 1
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    _store_file(path, signature, data)
+    return data
+
+
+def write_daily_file(path, data):
+    """Write a daily attendance file and refresh the caches"""
+    with _lock:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4)
+        _store_file(path, file_signature(path), data)
+        invalidate_responses()
+
+
+def parsed_size(data):
+    """Estimated memory of a parsed daily file: its dicts, keys and strings"""
+    if isinstance(data, dict):
+        return sys.getsizeof(data) + sum(
+            sys.getsizeof(key) + parsed_size(value) for key, value in data.items()
+        )
+    if isinstance(data, list):
+        return sys.getsizeof(data) + sum(parsed_size(value) for value in data)
+    return sys.getsizeof(data)
+
+
+def _store_file(path, signature, data):
+    global _files_bytes
+    size = parsed_size(data)
+
+    with _lock:
+        if path in _files:
+            _files_bytes -= _files.pop(path)[2]
+
+        if size > MAX_CACHED_BYTES:
+            return
+
+        _files[path] = (signature, data, size)
+        _files_bytes += size
+
+        while len(_files) > MAX_CACHED_FILES or _files_bytes > MAX_CACHED_BYTES:
+            _, (_, _, evicted_size) = _files.popitem(last=False)
+            _files_bytes -= evicted_size
+            CACHE_STATS['file_evictions'] += 1
+
+
+def cached_response(key, build):
+    """Return the serialized response for key, building it on a miss.
+
+    Entries stay valid until the next invalidate_responses() call.
+    """
+    with _lock:
+        full_key = (_generation, key)
+        body = _responses.get(full_key)
+        if body is not None:
+            _responses.move_to_end(full_key)
+            CACHE_STATS['response_hits'] += 1
+            return body
+        CACHE_STATS['response_misses'] += 1
+
+    body = build()
+
+    with _lock:
+        # Drop the result if a write happened while it was being built
+        if full_key[0] == _generation:
+            _responses[full_key] = body
+            while len(_responses) > MAX_CACHED_RESPONSES:
+                _responses.popitem(last=False)
+    return body
+
+
+def invalidate_responses():
+    """Forget all cached responses after attendance or roster data changes"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _responses.clear()
+
+
+def get_cache_stats():
+    """Counters plus current cache sizes"""
+    with _lock:
+        stats = dict(CACHE_STATS)
+        stats['cached_files'] = len(_files)
+        stats['cached_file_bytes'] = _files_bytes
+        stats['cached_responses'] = len(_responses)
+    return stats
@@ -0,0 +1,283 @@
+# attendance_history.py - Compact columnar attendance history with memory-mapped reads
+#
+# A history directory holds one term of attendance:
+#   records.npy   structured array of (day, student, subject, seconds)
+#   days.npy      every day that has an attendance file, as days since 1970-01-01
+#   students.json student ids, indexed by the integer id used in records
+#   subjects.json subject names, indexed the same way
+#
+# Legacy daily files store a single "HH:MM:SS" per student instead of a
+# dict of subjects; those marks are kept with subject id ALL_SUBJECTS and,
+# as in the JSON scan (see is_marked), count as present for every subject.
+import argparse
+import json
+import os
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([
+    ('day', '<i4'),
+    ('student', '<i4'),
+    ('subject', '<i2'),
+    ('seconds', '<i4')
+])
+
+ALL_SUBJECTS = -1
+
+
+def is_marked(entry, subject):
+    """Whether a student's entry in a daily file counts as attending subject.
+
+    Legacy entries are a bare time string with no subjects and have always
+    counted as present for every subject. Both the JSON scan in app.py and
+    the history queries below follow this rule.
+    """
+    if isinstance(entry, dict):
+        return subject in entry
+    return True
+
+
+def _date_to_day(date_str):
+    return int(np.datetime64(date_str, 'D').astype(np.int64))
+
+
+def _day_to_date(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+def _time_to_seconds(time_str):
+    hours, minutes, seconds = (int(part) for part in time_str.split(':'))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _seconds_to_time(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+def convert_json_to_history(records_dir, history_dir, start_date=None, end_date=None):
+    """Convert attendance_<date>.json files into a history directory.
+
+    start_date and end_date ('YYYY-MM-DD', inclusive) limit the term.
+    Returns the number of records written.
+    """
+    dates = []
+    for filename in os.listdir(records_dir):
+        if filename.startswith('attendance_') and filename.endswith('.json'):
+            date_str = filename.replace('attendance_', '').replace('.json', '')
+            if start_date and date_str < start_date:
+                continue
+            if end_date and date_str > end_date:
+                continue
+            dates.append(date_str)
+    dates.sort()
+
+    student_ids = {}
+    subject_ids = {}
+    rows = []
+
+    for date_str in dates:
+        with open(os.path.join(records_dir, f'attendance_{date_str}.json'), 'r') as f:
+            attendance_data = json.load(f)
+
+        day = _date_to_day(date_str)
+        for student, marks in attendance_data.items():
+            student_id = student_ids.setdefault(student, len(student_ids))
+            if isinstance(marks, dict):
+                for subject, time_str in marks.items():
+                    subject_id = subject_ids.setdefault(subject, len(subject_ids))
+                    rows.append((day, student_id, subject_id, _time_to_seconds(time_str)))
+            else:
+                rows.append((day, student_id, ALL_SUBJECTS, _time_to_seconds(marks)))
+
+    records = np.array(rows, dtype=RECORD_DTYPE)
+    # Keep each student's marks contiguous for the per-student queries
+    records = records[np.lexsort((records['day'], records['subject'], records['student']))]
+    days = np.array([_date_to_day(d) for d in dates], dtype='<i4')
+
+    os.makedirs(history_dir, exist_ok=True)
+    np.save(os.path.join(history_dir, 'records.npy'), records)
+    np.save(os.path.join(history_dir, 'days.npy'), days)
+    with open(os.path.join(history_dir, 'students.json'), 'w') as f:
+        json.dump(list(student_ids), f, indent=4)
+    with open(os.path.join(history_dir, 'subjects.json'), 'w') as f:
+        json.dump(list(subject_ids), f, indent=4)
+
+    return len(records)
+
+
+def history_to_daily(history):
+    """Rebuild {day: parsed daily file} from a loaded history"""
+    records = history['records']
+    students = history['students']
+    subjects = history['subjects']
+
+    per_day = {int(day): {} for day in history['days']}
+    for day, student, subject, seconds in records.tolist():
+        attendance_data = per_day.setdefault(day, {})
+        name = students[student]
+        if subject == ALL_SUBJECTS:
+            attendance_data[name] = _seconds_to_time(seconds)
+        else:
+            if not isinstance(attendance_data.get(name), dict):
+                attendance_data[name] = {}
+            attendance_data[name][subjects[subject]] = _seconds_to_time(seconds)
+
+    return per_day
+
+
+def export_history_to_json(history, records_dir):
+    """Write a loaded history back out as attendance_<date>.json files.
+
+    The files parse to the same data as the originals, but are not byte
+    for byte copies: keys come out in history order and line endings are
+    the platform's.
+    """
+    os.makedirs(records_dir, exist_ok=True)
+    per_day = history_to_daily(history)
+
+    for day, attendance_data in per_day.items():
+        path = os.path.join(records_dir, f'attendance_{_day_to_date(day)}.json')
+        with open(path, 'w') as f:
+            json.dump(attendance_data, f, indent=4)
+
+    return len(per_day)
+
+
+def load_history(history_dir):
+    """Open a history directory; the record arrays are memory-mapped"""
+    with open(os.path.join(history_dir, 'students.json'), 'r') as f:
+        students = json.load(f)
+    with open(os.path.join(history_dir, 'subjects.json'), 'r') as f:
+        subjects = json.load(f)
+
+    days = np.load(os.path.join(history_dir, 'days.npy'), mmap_mode='r')
+    return {
+        'records': np.load(os.path.join(history_dir, 'records.npy'), mmap_mode='r'),
+        'days': days,
+        'dates': set(_day_to_date(day) for day in days),
+        'students': students,
+        'subjects': subjects,
+        'student_ids': {name: i for i, name in enumerate(students)},
+        'subject_ids': {name: i for i, name in enumerate(subjects)}
+    }
+
+
+def _student_records(history, student):
+    """Slice of records for one student, found by binary search on the sorted ids"""
+    records = history['records']
+    student_id = history['student_ids'].get(student)
+    if student_id is None:
+        return records[:0]
+    lo, hi = np.searchsorted(records['student'], [student_id, student_id + 1])
+    return records[lo:hi]
+
+
+def absent_dates(history, student, subject):
+    """Dates in the history when the student was not marked for the subject.
+
+    ALL_SUBJECTS records count as present, matching is_marked.
+    """
+    records = _student_records(history, student)
+    subject_id = history['subject_ids'].get(subject, -2)
+    present = records['day'][(records['subject'] == subject_id) | (records['subject'] == ALL_SUBJECTS)]
+
+    days = np.asarray(history['days'])
+    absent = days[~np.isin(days, present)]
+    return [_day_to_date(day) for day in absent]
+
+
+def attendance_percentages(history):
+    """Percentage of recorded days each student was present for each subject.
+
+    Returns {student: {subject: percentage}} for students with any marks.
+    """
+    records = history['records']
+    n_students = len(history['students'])
+    n_subjects = len(history['subjects'])
+    n_days = len(history['days'])
+    if n_days == 0 or n_students == 0:
+        return {}
+
+    counts = np.zeros((n_students, n_subjects), dtype=np.int64)
+    by_subject = records['subject'] != ALL_SUBJECTS
+    flat = records['student'][by_subject].astype(np.int64) * n_subjects + records['subject'][by_subject]
+    counts += np.bincount(flat, minlength=n_students * n_subjects).reshape(n_students, n_subjects)
+
+    # Legacy marks count as present for every subject that day
+    legacy = records[~by_subject]
+    counts += np.bincount(legacy['student'], minlength=n_students)[:, None]
+
+    percentages = np.round(np.minimum(counts, n_days) / n_days * 100, 1)
+    return {
+        student: dict(zip(history['subjects'], percentages[i].tolist()))
+        for i, student in enumerate(history['students'])
+    }
+
+
+def verify_history(history, records_dir, subjects):
+    """Compare the history with the JSON files it was converted from.
+
+    Every day in the history must still have its JSON file. Returns the
+    dates whose parsed contents differ from the history, and a list of
+    (student, subject, json_dates, history_dates) for each disagreement
+    in absent dates.
+    """
+    per_day = history_to_daily(history)
+    daily = []
+    changed_dates = []
+    for day in history['days']:
+        date_str = _day_to_date(day)
+        with open(os.path.join(records_dir, f'attendance_{date_str}.json'), 'r') as f:
+            attendance_data = json.load(f)
+        daily.append((date_str, attendance_data))
+        if attendance_data != per_day[int(day)]:
+            changed_dates.append(date_str)
+
+    mismatches = []
+    for student in history['students']:
+        for subject in subjects:
+            json_dates = [
+                date_str for date_str, attendance_data in daily
+                if student not in attendance_data or not is_marked(attendance_data[student], subject)
+            ]
+            history_dates = absent_dates(history, student, subject)
+            if json_dates != history_dates:
+                mismatches.append((student, subject, json_dates, history_dates))
+    return changed_dates, mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert attendance history between JSON and columnar formats')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    to_history = subparsers.add_parser('convert', help='JSON daily files -> history directory')
+    to_history.add_argument('records_dir')
+    to_history.add_argument('history_dir')
+    to_history.add_argument('--start')
+    to_history.add_argument('--end')
+
+    to_json = subparsers.add_parser('export', help='history directory -> JSON daily files')
+    to_json.add_argument('history_dir')
+    to_json.add_argument('records_dir')
+
+    verify = subparsers.add_parser('verify', help='check the history against the JSON files')
+    verify.add_argument('history_dir')
+    verify.add_argument('records_dir')
+    verify.add_argument('subjects', nargs='*', help='subjects to check (default: all in the history)')
+
+    args = parser.parse_args()
+    if args.command == 'convert':
+        count = convert_json_to_history(args.records_dir, args.history_dir, args.start, args.end)
+        print(f"Wrote {count} records to {args.history_dir}")
+    elif args.command == 'export':
+        count = export_history_to_json(load_history(args.history_dir), args.records_dir)
+        print(f"Wrote {count} daily files to {args.records_dir}")
+    else:
+        history = load_history(args.history_dir)
+        changed_dates, mismatches = verify_history(history, args.records_dir, args.subjects or history['subjects'])
+        for date_str in changed_dates:
+            print(f"{date_str}: JSON contents differ from the history")
+        for student, subject, json_dates, history_dates in mismatches:
+            print(f"{student} / {subject}: JSON {json_dates} history {history_dates}")
+        print(f"{len(changed_dates)} changed days, {len(mismatches)} mismatches")
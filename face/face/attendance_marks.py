@@ -0,0 +1,71 @@
+# attendance_marks.py - Recording attendance marks in daily files and counters
+#
+# Local recognitions, video jobs and marks received from other instances all
+# go through record_marks, so each (date, student, subject) is counted once.
+import copy
+
+from attendance_cache import load_daily_file, write_daily_file
+
+
+def merge_marks(attendance_data, subject, marks):
+    """Merge {student_id: 'HH:MM:SS'} marks for one subject into a parsed daily file.
+
+    A student already marked for the subject is not marked again; only the
+    earlier of the two times is kept, so every instance ends up with the
+    same file. Returns (updated, newly_marked) where updated holds every
+    mark that was written, new or moved earlier.
+    """
+    updated = {}
+    newly_marked = []
+
+    for name, mark_time in marks.items():
+        if name not in attendance_data or not isinstance(attendance_data[name], dict):
+            attendance_data[name] = {}
+
+        if subject in attendance_data[name]:
+            if mark_time < attendance_data[name][subject]:
+                attendance_data[name][subject] = mark_time
+                updated[name] = mark_time
+            continue
+
+        attendance_data[name][subject] = mark_time
+        updated[name] = mark_time
+        newly_marked.append(name)
+
+    return updated, newly_marked
+
+
+def increment_counter(student_attendance, name, subject):
+    """Count one attended class for a student"""
+    if name not in student_attendance:
+        student_attendance[name] = {}
+
+    if subject not in student_attendance[name]:
+        student_attendance[name][subject] = {'present': 0, 'total': 0}
+
+    student_attendance[name][subject]['present'] += 1
+    student_attendance[name][subject]['total'] += 1
+
+
+def record_marks(attendance_file, subject, marks, student_attendance, registered=None):
+    """Apply marks to a daily file and count each newly marked student once.
+
+    The daily file is this instance's record of what it has counted, so a
+    mark that is already there is never counted again, whoever made it.
+    When registered is given, marks for ids outside it (students deleted
+    since) still go in the daily file, like marks made before a deletion,
+    but are not counted, so they do not recreate the deleted counters.
+    Callers must hold the attendance lock. Returns (updated, newly_marked)
+    as merge_marks does; updated is what other instances need to hear about.
+    """
+    attendance_data = copy.deepcopy(load_daily_file(attendance_file))
+    updated, newly_marked = merge_marks(attendance_data, subject, marks)
+
+    for name in newly_marked:
+        if registered is None or name in registered:
+            increment_counter(student_attendance, name, subject)
+
+    if updated:
+        write_daily_file(attendance_file, attendance_data)
+
+    return updated, newly_marked
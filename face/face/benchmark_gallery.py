@@ -0,0 +1,114 @@
+# benchmark_gallery.py - Gallery matching latency, memory and compact-mode accuracy
+import sys
+import time
+
+import numpy as np
+
+from gallery import ENCODING_SIZE, build_compact_gallery, build_gallery_matrix, match_face
+
+GALLERY_SIZES = [1000, 10000, 50000]
+ROSTER_SIZE = 60
+PROBES = 200
+
+COMPACT_IDENTITIES = 10000
+COMPACT_PROBES = 2000
+
+
+def synthetic_gallery(size, rng):
+    """Random encodings with roughly the spread of dlib face encodings"""
+    return [rng.normal(0, 0.09, ENCODING_SIZE) for _ in range(size)]
+
+
+def time_matches(matrix, probes, rows):
+    start = time.perf_counter()
+    hits = 0
+    for expected, probe in probes:
+        row, _ = match_face(matrix, probe, rows, fallback=True, tolerance=0.5)
+        hits += row == expected
+    elapsed = time.perf_counter() - start
+    return elapsed / len(probes) * 1000, hits / len(probes)
+
+
+def name_list_bytes(names):
+    """Memory held by a list of names, including the strings"""
+    return sys.getsizeof(names) + sum(sys.getsizeof(n) for n in names)
+
+
+def list_gallery_bytes(encodings, names):
+    """Memory held by the old per-face arrays and parallel name list"""
+    return sys.getsizeof(encodings) + sum(sys.getsizeof(e) for e in encodings) + name_list_bytes(names)
+
+
+def matrix_gallery_bytes(matrix, names):
+    """Memory held by the float64 gallery: one stacked matrix and a name list"""
+    return matrix.nbytes + name_list_bytes(names)
+
+
+def compact_gallery_bytes(gallery, names):
+    """Memory held by a compact gallery and its flat name array.
+
+    The app keeps no other copy of the names; rows are found with find_row.
+    """
+    total = sum(gallery[key].nbytes for key in ('data', 'scales', 'sq_norms'))
+    total += sys.getsizeof(names)
+    return total
+
+
+def compact_report(rng):
+    encodings = synthetic_gallery(COMPACT_IDENTITIES, rng)
+    names = [f'student_{i:05d}' for i in range(COMPACT_IDENTITIES)]
+    matrix = build_gallery_matrix(encodings)
+
+    # Genuine probes spread up to the tolerance, plus impostors that should not match
+    probes = []
+    for _ in range(COMPACT_PROBES):
+        expected = int(rng.integers(COMPACT_IDENTITIES))
+        noise = rng.uniform(0.01, 0.045)
+        probes.append((expected, matrix[expected] + rng.normal(0, noise, ENCODING_SIZE)))
+    for _ in range(COMPACT_PROBES // 4):
+        probes.append((None, rng.normal(0, 0.09, ENCODING_SIZE)))
+
+    reference = [match_face(matrix, probe)[0] for _, probe in probes]
+    reference_accuracy = np.mean([row == expected for row, (expected, _) in zip(reference, probes)])
+
+    print(f"\n{COMPACT_IDENTITIES} identities, {len(probes)} probes")
+    print(f"{'mode':>8} {'MB':>7} {'accuracy':>9} {'agrees w/ f64':>14}")
+    print(f"{'lists':>8} {list_gallery_bytes(encodings, names) / 1e6:>7.2f} "
+          f"{reference_accuracy:>9.2%} {1:>14.2%}")
+    print(f"{'float64':>8} {matrix_gallery_bytes(matrix, names) / 1e6:>7.2f} "
+          f"{reference_accuracy:>9.2%} {1:>14.2%}")
+
+    flat_names = np.array(names, dtype=str)
+    for mode in ('float16', 'int8'):
+        gallery = build_compact_gallery(matrix, mode)
+        results = [match_face(gallery, probe)[0] for _, probe in probes]
+        accuracy = np.mean([row == expected for row, (expected, _) in zip(results, probes)])
+        agreement = np.mean([a == b for a, b in zip(results, reference)])
+        size = compact_gallery_bytes(gallery, flat_names)
+        print(f"{mode:>8} {size / 1e6:>7.2f} {accuracy:>9.2%} {agreement:>14.2%}")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'gallery':>8} {'full ms':>9} {'roster ms':>10} {'speedup':>8} {'accuracy':>9}")
+
+    for size in GALLERY_SIZES:
+        matrix = build_gallery_matrix(synthetic_gallery(size, rng))
+        rows = np.sort(rng.choice(size, ROSTER_SIZE, replace=False)).astype(np.intp)
+
+        probes = []
+        for _ in range(PROBES):
+            expected = int(rng.choice(rows))
+            probes.append((expected, matrix[expected] + rng.normal(0, 0.02, ENCODING_SIZE)))
+
+        full_ms, _ = time_matches(matrix, probes, None)
+        roster_ms, accuracy = time_matches(matrix, probes, rows)
+
+        print(f"{size:>8} {full_ms:>9.3f} {roster_ms:>10.3f} "
+              f"{full_ms / roster_ms:>7.1f}x {accuracy:>9.1%}")
+
+    compact_report(rng)
+
+
+if __name__ == '__main__':
+    main()
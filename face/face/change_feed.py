@@ -0,0 +1,119 @@
+# change_feed.py - SQLite change-feed that keeps app instances in sync
+#
+# All instances must run on one host with the feed file on a local disk.
+# SQLite's locking is not reliable over network filesystems, so instances
+# on several hosts cannot share a feed file.
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30)
+    # WAL needs shared memory between the processes; the rollback journal
+    # relies only on file locks. This also switches feeds created in WAL mode
+    connection.execute('PRAGMA journal_mode=DELETE')
+    return connection
+
+
+def init_feed(path):
+    """Create the events table if the feed file is new"""
+    with _connect(path) as connection:
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'node TEXT NOT NULL, '
+            'kind TEXT NOT NULL, '
+            'payload TEXT NOT NULL, '
+            'created_at TEXT NOT NULL)'
+        )
+    return latest_seq(path)
+
+
+def publish(path, node_id, kind, payload):
+    """Append an event to the feed and return its sequence number"""
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with _connect(path) as connection:
+        cursor = connection.execute(
+            'INSERT INTO events (node, kind, payload, created_at) VALUES (?, ?, ?, ?)',
+            (node_id, kind, json.dumps(payload), created_at)
+        )
+        return cursor.lastrowid
+
+
+def latest_seq(path):
+    """Sequence number of the newest event, or 0 for an empty feed"""
+    with _connect(path) as connection:
+        row = connection.execute('SELECT MAX(seq) FROM events').fetchone()
+    return row[0] or 0
+
+
+def read_since(path, seq, limit=500):
+    """Events with a sequence number greater than seq, oldest first"""
+    with _connect(path) as connection:
+        rows = connection.execute(
+            'SELECT seq, node, kind, payload FROM events WHERE seq > ? ORDER BY seq LIMIT ?',
+            (seq, limit)
+        ).fetchall()
+    return [
+        {'seq': row[0], 'node': row[1], 'kind': row[2], 'payload': json.loads(row[3])}
+        for row in rows
+    ]
+
+
+def load_checkpoint(checkpoint_path):
+    """Sequence number of the last event this node applied, or 0"""
+    try:
+        with open(checkpoint_path, 'r') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def save_checkpoint(checkpoint_path, seq):
+    """Persist the follower position atomically"""
+    temp_path = f'{checkpoint_path}.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(str(seq))
+    os.replace(temp_path, checkpoint_path)
+
+
+def start_follower(path, node_id, apply_event, from_seq=0, poll_seconds=1.0, checkpoint_path=None):
+    """Apply events published by other nodes in a background thread.
+
+    Events from node_id itself are skipped since they were applied when
+    published. With checkpoint_path the position is saved after every
+    batch so a restarted node resumes where it stopped. Returns a dict
+    with the position and a stop event.
+    """
+    follower = {'seq': from_seq, 'applied': 0, 'stop_event': threading.Event()}
+
+    def follow():
+        while not follower['stop_event'].is_set():
+            try:
+                events = read_since(path, follower['seq'])
+            except sqlite3.Error as e:
+                print(f"Error reading change feed: {e}")
+                events = []
+
+            for event in events:
+                if event['node'] != node_id:
+                    try:
+                        apply_event(event)
+                        follower['applied'] += 1
+                    except Exception as e:
+                        print(f"Error applying change {event['seq']} ({event['kind']}): {e}")
+                follower['seq'] = event['seq']
+
+            if events and checkpoint_path:
+                save_checkpoint(checkpoint_path, follower['seq'])
+
+            if not events:
+                time.sleep(poll_seconds)
+
+    thread = threading.Thread(target=follow, daemon=True)
+    thread.start()
+    return follower
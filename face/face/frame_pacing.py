@@ -0,0 +1,138 @@
+# frame_pacing.py - Server-driven frame rate and resolution hints for camera clients
+import math
+import os
+import random
+import threading
+import time
+
+# Hints given to clients when the server is keeping up
+BASE_FRAME_DELAY_MS = 500
+MAX_FRAME_DELAY_MS = 5000
+
+# Frames processed concurrently before new ones effectively queue
+CAPACITY = int(os.environ.get('RECOGNITION_CAPACITY', os.cpu_count() or 2))
+TARGET_UTILIZATION = 0.8
+TARGET_LATENCY_MS = 1000
+
+# (max frame width, JPEG quality), full size first. Recognition cost is
+# taken to scale with pixel count, so each level is cheaper by (width / full)^2
+DEGRADATION_LEVELS = [
+    (1280, 0.7),
+    (960, 0.65),
+    (640, 0.55),
+    (480, 0.5)
+]
+FULL_WIDTH = DEGRADATION_LEVELS[0][0]
+
+# In-flight frames are averaged over time, not per arrival, so a burst of
+# arrivals weighs no more than the time it keeps workers busy
+LOAD_WINDOW_SECONDS = 0.5
+
+# The load level moves by a factor of the pressure every this long. Pressure
+# is clamped because clients only see a new delay after their next frame,
+# and a larger step overshoots before the effect is measured
+ADJUST_SECONDS = 2.0
+PRESSURE_BOUNDS = (0.5, 2.0)
+
+# Delays are spread by this fraction so clients do not send in step
+DELAY_JITTER = 0.2
+
+# Load level at which the lightest frames reach the longest delay
+MAX_LOAD = (MAX_FRAME_DELAY_MS / BASE_FRAME_DELAY_MS) * (FULL_WIDTH / DEGRADATION_LEVELS[-1][0]) ** 2
+
+_state = {
+    'in_flight': 0,
+    'avg_in_flight': 0.0,
+    'updated_at': time.perf_counter(),
+    'latency_ms': None,
+    'load': 1.0,
+    'adjusted_at': time.perf_counter()
+}
+_lock = threading.Lock()
+
+
+def _advance(now):
+    """Fold the in-flight count since the last update into the time-weighted average"""
+    elapsed = now - _state['updated_at']
+    weight = 1 - math.exp(-elapsed / LOAD_WINDOW_SECONDS)
+    _state['avg_in_flight'] += weight * (_state['in_flight'] - _state['avg_in_flight'])
+    _state['updated_at'] = now
+
+
+def frame_started():
+    """Record a frame entering the server; returns a start timestamp"""
+    now = time.perf_counter()
+    with _lock:
+        _advance(now)
+        _state['in_flight'] += 1
+    return now
+
+
+def frame_finished(started):
+    """Record a frame leaving the server and fold its latency into the average"""
+    now = time.perf_counter()
+    latency_ms = (now - started) * 1000
+    with _lock:
+        _advance(now)
+        _state['in_flight'] -= 1
+        if _state['latency_ms'] is None:
+            _state['latency_ms'] = latency_ms
+        else:
+            _state['latency_ms'] += 0.2 * (latency_ms - _state['latency_ms'])
+
+
+def reset_pacing():
+    """Forget measured load, e.g. between load-simulation runs"""
+    now = time.perf_counter()
+    with _lock:
+        _state['avg_in_flight'] = float(_state['in_flight'])
+        _state['updated_at'] = now
+        _state['latency_ms'] = None
+        _state['load'] = 1.0
+        _state['adjusted_at'] = now
+
+
+def pacing_hints():
+    """Next-frame delay, resolution and quality the client should use.
+
+    Pressure is how far the server is from its targets, from either the
+    time-weighted concurrency or frame latency. The load level, in units of
+    full-size frames at the base delay, integrates it: it grows while the
+    server is over target and shrinks while under, so it settles where
+    workers run at TARGET_UTILIZATION. Resolution steps down first, then
+    the delay grows to absorb what is left.
+    """
+    now = time.perf_counter()
+    with _lock:
+        _advance(now)
+        in_flight = _state['in_flight']
+        avg_in_flight = _state['avg_in_flight']
+        latency_ms = _state['latency_ms'] or 0.0
+
+        pressure = max(
+            avg_in_flight / (CAPACITY * TARGET_UTILIZATION),
+            latency_ms / TARGET_LATENCY_MS
+        )
+        pressure = min(PRESSURE_BOUNDS[1], max(PRESSURE_BOUNDS[0], pressure))
+        elapsed = now - _state['adjusted_at']
+        load = _state['load'] * pressure ** (elapsed / ADJUST_SECONDS)
+        _state['load'] = load = min(MAX_LOAD, max(1.0, load))
+        _state['adjusted_at'] = now
+
+    max_width, jpeg_quality = DEGRADATION_LEVELS[-1]
+    for width, quality in DEGRADATION_LEVELS:
+        if load * (width / FULL_WIDTH) ** 2 <= 1:
+            max_width, jpeg_quality = width, quality
+            break
+
+    delay_ms = BASE_FRAME_DELAY_MS * max(1.0, load * (max_width / FULL_WIDTH) ** 2)
+    delay_ms *= random.uniform(1 - DELAY_JITTER, 1 + DELAY_JITTER)
+
+    return {
+        'next_frame_ms': int(min(MAX_FRAME_DELAY_MS, delay_ms)),
+        'max_width': max_width,
+        'jpeg_quality': jpeg_quality,
+        'queue_depth': max(0, in_flight - CAPACITY),
+        'latency_ms': round(latency_ms),
+        'utilization': round(min(avg_in_flight, CAPACITY) / CAPACITY, 2)
+    }
@@ -0,0 +1,160 @@
+# gallery.py - Face gallery matrix and per-subject roster views
+import numpy as np
+
+ENCODING_SIZE = 128
+
+# Storage modes for the gallery; anything other than float64 is compact
+GALLERY_MODES = ('float64', 'float16', 'int8')
+
+# Rows converted to float32 at a time when scoring a compact gallery
+DISTANCE_CHUNK_ROWS = 4096
+
+
+def build_gallery_matrix(encodings):
+    """Stack face encodings into a single (N, 128) matrix"""
+    if len(encodings) == 0:
+        return np.empty((0, ENCODING_SIZE), dtype=np.float64)
+    return np.vstack(encodings)
+
+
+def build_compact_gallery(matrix, mode='int8'):
+    """Store a gallery matrix as float16 or int8 with per-row scales.
+
+    int8 rows are scaled so their largest component maps to 127. Squared
+    row norms are precomputed so distances can be taken without
+    dequantizing the whole matrix.
+    """
+    if mode not in ('float16', 'int8'):
+        raise ValueError(f'Unknown compact gallery mode: {mode}')
+
+    if mode == 'float16':
+        data = matrix.astype(np.float16)
+        scales = np.ones(len(matrix), dtype=np.float32)
+    else:
+        scales = (np.abs(matrix).max(axis=1) / 127).astype(np.float32)
+        scales[scales == 0] = 1
+        data = np.round(matrix / scales[:, None]).astype(np.int8)
+
+    restored = data.astype(np.float32) * scales[:, None]
+    return {
+        'mode': mode,
+        'data': data,
+        'scales': scales,
+        'sq_norms': np.einsum('ij,ij->i', restored, restored)
+    }
+
+
+def build_gallery(encodings, mode='float64'):
+    """Build the gallery in the requested storage mode"""
+    if mode not in GALLERY_MODES:
+        raise ValueError(f'Unknown gallery mode: {mode}')
+
+    matrix = build_gallery_matrix(encodings)
+    if mode == 'float64':
+        return matrix
+    return build_compact_gallery(matrix, mode)
+
+
+def append_to_gallery(gallery, encoding):
+    """Return a new gallery with one encoding added as the last row"""
+    row = np.asarray(encoding, dtype=np.float64)[None, :]
+    if not isinstance(gallery, dict):
+        return np.vstack([gallery, row])
+
+    added = build_compact_gallery(row, gallery['mode'])
+    return {
+        'mode': gallery['mode'],
+        **{key: np.concatenate([gallery[key], added[key]]) for key in ('data', 'scales', 'sq_norms')}
+    }
+
+
+def remove_from_gallery(gallery, row):
+    """Return a new gallery without the given row"""
+    if not isinstance(gallery, dict):
+        return np.delete(gallery, row, axis=0)
+
+    return {
+        'mode': gallery['mode'],
+        **{key: np.delete(gallery[key], row, axis=0) for key in ('data', 'scales', 'sq_norms')}
+    }
+
+
+def find_row(names, name):
+    """Gallery row of a name in a list or flat name array, or None.
+
+    A linear scan, so callers keep no second name -> row map; rows are only
+    looked up when a face is removed or replaced.
+    """
+    rows = np.flatnonzero(np.asarray(names, dtype=str) == name)
+    return int(rows[0]) if len(rows) else None
+
+
+def gallery_size(gallery):
+    """Number of identities in a plain or compact gallery"""
+    if isinstance(gallery, dict):
+        return len(gallery['data'])
+    return len(gallery)
+
+
+def gallery_distances(gallery, face_encoding, rows=None):
+    """Euclidean distances from face_encoding to the (selected) gallery rows"""
+    if not isinstance(gallery, dict):
+        candidates = gallery if rows is None else gallery[rows]
+        return np.linalg.norm(candidates - face_encoding, axis=1)
+
+    data = gallery['data'] if rows is None else gallery['data'][rows]
+    scales = gallery['scales'] if rows is None else gallery['scales'][rows]
+    sq_norms = gallery['sq_norms'] if rows is None else gallery['sq_norms'][rows]
+
+    # |s*q - x|^2 = s^2|q|^2 - 2s(q.x) + |x|^2, with s^2|q|^2 precomputed
+    probe = np.asarray(face_encoding, dtype=np.float32)
+    dots = np.empty(len(data), dtype=np.float32)
+    for start in range(0, len(data), DISTANCE_CHUNK_ROWS):
+        chunk = data[start:start + DISTANCE_CHUNK_ROWS]
+        dots[start:start + len(chunk)] = chunk.astype(np.float32) @ probe
+
+    sq_distances = sq_norms - 2 * scales * dots + probe @ probe
+    return np.sqrt(np.maximum(sq_distances, 0))
+
+
+def build_subject_index(names, enrollments, subjects):
+    """Map each subject to the gallery rows of the students enrolled in it
+
+    enrollments maps student ids to their list of subjects.
+    """
+    subject_index = {}
+    for subject in subjects:
+        rows = [
+            row for row, name in enumerate(names)
+            if subject in enrollments.get(str(name), ())
+        ]
+        subject_index[subject] = np.array(rows, dtype=np.intp)
+    return subject_index
+
+
+def best_match(gallery, face_encoding, rows=None, tolerance=0.5):
+    """Find the closest gallery row, optionally searching only the given rows.
+
+    Returns (row, distance); row is None when nothing is within tolerance.
+    """
+    if (gallery_size(gallery) if rows is None else len(rows)) == 0:
+        return None, None
+
+    distances = gallery_distances(gallery, face_encoding, rows)
+    best = int(np.argmin(distances))
+    distance = float(distances[best])
+
+    if distance >= tolerance:
+        return None, distance
+
+    if rows is not None:
+        best = int(rows[best])
+    return best, distance
+
+
+def match_face(gallery, face_encoding, rows=None, fallback=True, tolerance=0.5):
+    """Search a roster view first, then the full gallery if fallback is enabled"""
+    row, distance = best_match(gallery, face_encoding, rows, tolerance)
+    if row is None and rows is not None and fallback:
+        row, distance = best_match(gallery, face_encoding, None, tolerance)
+    return row, distance
@@ -0,0 +1,144 @@
+# simulate_camera_load.py - Show frame latency as camera clients are added
+#
+# By default the server is simulated: CAPACITY workers whose per-frame cost
+# scales with the number of pixels, fed through frame_pacing exactly as
+# /api/recognize_face is. Clients either follow the pacing hints or use the
+# old fixed 500 ms interval at full resolution.
+#
+# Worker utilization is reported next to latency, so low latency bought by
+# starving clients shows up as idle workers. For the simulated server it is
+# measured from the work done; against a live app it is the average of the
+# utilization the server reports in its hints.
+#
+# With --url and --image, clients post a real JPEG to a running app instead:
+#   python simulate_camera_load.py --url http://localhost:5000 --image known_faces/shree.jpg
+import argparse
+import base64
+import json
+import threading
+import time
+import urllib.request
+
+import frame_pacing
+
+CLIENT_COUNTS = [1, 5, 10, 20, 40]
+FULL_WIDTH = 1280
+FULL_FRAME_SECONDS = 0.4
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def frame_seconds(width):
+    return FULL_FRAME_SECONDS * (width / FULL_WIDTH) ** 2
+
+
+def simulated_server(capacity):
+    workers = threading.Semaphore(capacity)
+
+    def recognize(width, quality):
+        started = frame_pacing.frame_started()
+        try:
+            with workers:
+                time.sleep(frame_seconds(width))
+        finally:
+            frame_pacing.frame_finished(started)
+        return frame_pacing.pacing_hints()
+
+    return recognize
+
+
+def http_server(url, image_path):
+    import cv2
+
+    image = cv2.imread(image_path)
+
+    def recognize(width, quality):
+        scale = min(1.0, width / image.shape[1])
+        frame = cv2.resize(image, None, fx=scale, fy=scale) if scale < 1 else image
+        encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality * 100)])[1]
+        body = json.dumps({
+            'image': 'data:image/jpeg;base64,' + base64.b64encode(encoded.tobytes()).decode('ascii'),
+            'subject': 'Mathematics'
+        }).encode()
+        request = urllib.request.Request(
+            url.rstrip('/') + '/api/recognize_face', data=body,
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.load(response).get('pacing')
+
+    return recognize
+
+
+def run_clients(recognize, clients, seconds, warmup, adaptive):
+    """Returns (latencies in ms, simulated worker seconds, reported utilizations)"""
+    latencies = []
+    work = [0.0]
+    reported = []
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + seconds
+
+    def client():
+        delay_ms, width, quality = 500, FULL_WIDTH, 0.7
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            hints = recognize(width, quality)
+            latency = time.perf_counter() - started
+            if started >= measure_from:
+                with lock:
+                    latencies.append(latency * 1000)
+                    work[0] += frame_seconds(width)
+                    if hints and 'utilization' in hints:
+                        reported.append(hints['utilization'])
+
+            if adaptive and hints:
+                delay_ms, width, quality = hints['next_frame_ms'], hints['max_width'], hints['jpeg_quality']
+
+            # camera.html waits for the reply, then at least delay_ms since the last send
+            time.sleep(max(0.0, delay_ms / 1000 - latency))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, work[0], reported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Camera client load simulation')
+    parser.add_argument('--seconds', type=float, default=6)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--capacity', type=int, default=4)
+    parser.add_argument('--url')
+    parser.add_argument('--image')
+    args = parser.parse_args()
+
+    if args.url:
+        recognize = http_server(args.url, args.image)
+    else:
+        frame_pacing.CAPACITY = args.capacity
+        recognize = simulated_server(args.capacity)
+
+    print(f"{'clients':>7} {'mode':>8} {'frames/s':>9} {'width':>6} {'busy':>5} {'p50 ms':>8} {'p95 ms':>8}")
+    for clients in CLIENT_COUNTS:
+        for adaptive in (False, True):
+            frame_pacing.reset_pacing()
+            latencies, work, reported = run_clients(recognize, clients, args.seconds, args.warmup, adaptive)
+            if args.url:
+                busy = sum(reported) / len(reported) if reported else 0.0
+            else:
+                busy = work / (args.capacity * args.seconds)
+            # Average width implied by the work done per frame
+            width = FULL_WIDTH * (work / len(latencies) / FULL_FRAME_SECONDS) ** 0.5 if latencies else 0
+            print(f"{clients:>7} {'adaptive' if adaptive else 'fixed':>8} "
+                  f"{len(latencies) / args.seconds:>9.1f} {width:>6.0f} {busy:>5.0%} "
+                  f"{percentile(latencies, 0.5):>8.0f} {percentile(latencies, 0.95):>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+# simulate_change_feed.py - Check that several processes converge through the change-feed
+#
+# Each process stands in for an app.py node with its own data directory.
+# Local marks and marks received from the feed go through
+# attendance_marks.record_marks under a lock, exactly as mark_attendance and
+# apply_attendance_marks do, and the follower saves a checkpoint as in
+# start_change_feed. Marks come from a small roster and a few seconds of
+# clock time, so nodes often mark the same student in the same second.
+# Registrations come from the feed, and one node deletes a student while
+# another is marking them.
+#
+# Afterwards a late node replays the whole feed from #0, twice. Every node
+# must end up with the same daily files, roster and counters, and every
+# counter of a registered student must equal the number of days the student
+# was marked for the subject.
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import change_feed
+from attendance_cache import load_daily_file
+from attendance_marks import record_marks
+
+NODES = 4
+MARKS_PER_NODE = 300
+ROSTER_SIZE = 12
+DELETED = 'student_1'
+SUBJECTS = ['Mathematics', 'Physics', 'Chemistry']
+DATES = ['2025-12-10', '2025-12-11']
+TIMES = ['10:00:00', '10:00:01', '10:00:02']
+
+
+class Node:
+    """Attendance state of one simulated app instance"""
+
+    def __init__(self, node_id, feed_path, data_dir):
+        self.node_id = node_id
+        self.feed_path = feed_path
+        self.student_attendance = {}
+        self.registered = set()
+        self.lock = threading.RLock()
+        self.checkpoint_path = 'change_feed_seq'
+
+        os.chdir(data_dir)
+        os.makedirs('attendance_records', exist_ok=True)
+
+    def mark(self, name, subject, date, mark_time):
+        """mark_attendance_bulk: record locally, publish whatever was written"""
+        # Only faces in this node's gallery are recognized
+        if name not in self.registered:
+            return
+
+        attendance_file = f'attendance_records/attendance_{date}.json'
+        with self.lock:
+            updated, _ = record_marks(
+                attendance_file, subject, {name: mark_time}, self.student_attendance, set(self.registered)
+            )
+        if updated:
+            change_feed.publish(self.feed_path, self.node_id, 'mark_attendance', {
+                'subject': subject, 'date': date, 'marks': updated
+            })
+
+    def delete(self, name):
+        """delete_student: drop the roster entry and counters, then publish"""
+        self.delete_student(name)
+        change_feed.publish(self.feed_path, self.node_id, 'delete_student', {'student_id': name})
+
+    def delete_student(self, name):
+        with self.lock:
+            self.registered.discard(name)
+            self.student_attendance.pop(name, None)
+
+    def apply(self, event):
+        """apply_change for an event from another node"""
+        payload = event['payload']
+        if event['kind'] == 'register_face':
+            with self.lock:
+                self.registered.add(payload['user_id'])
+                if payload['user_id'] not in self.student_attendance:
+                    self.student_attendance[payload['user_id']] = {
+                        subject: {'present': 0, 'total': 0} for subject in SUBJECTS
+                    }
+        elif event['kind'] == 'delete_student':
+            self.delete_student(payload['student_id'])
+        else:
+            attendance_file = f"attendance_records/attendance_{payload['date']}.json"
+            with self.lock:
+                record_marks(
+                    attendance_file, payload['subject'], payload['marks'],
+                    self.student_attendance, set(self.registered)
+                )
+
+    def wait_for(self, follower, seq):
+        while follower['seq'] < seq:
+            time.sleep(0.02)
+
+    def follow(self):
+        """start_change_feed: resume from the saved checkpoint"""
+        seq = change_feed.load_checkpoint(self.checkpoint_path)
+        return change_feed.start_follower(
+            self.feed_path, self.node_id, self.apply,
+            from_seq=seq, poll_seconds=0.02, checkpoint_path=self.checkpoint_path
+        )
+
+    def catch_up(self, follower):
+        self.wait_for(follower, change_feed.latest_seq(self.feed_path))
+        follower['stop_event'].set()
+
+    def snapshot(self):
+        with self.lock:
+            files = {date: load_daily_file(f'attendance_records/attendance_{date}.json') for date in DATES}
+            return json.dumps({
+                'files': files,
+                'counters': self.student_attendance,
+                'registered': sorted(self.registered)
+            }, sort_keys=True)
+
+
+def run_node(node_id, feed_path, roster_seq, barrier, results):
+    node = Node(node_id, feed_path, tempfile.mkdtemp(prefix=f'{node_id}-'))
+    follower = node.follow()
+    node.wait_for(follower, roster_seq)
+
+    # Every node sees the same student in the same second, while node-0
+    # deletes a student that node-1 is marking
+    barrier.wait()
+    if node_id == 'node-0':
+        node.delete(DELETED)
+    if node_id == 'node-1':
+        node.mark(DELETED, SUBJECTS[0], DATES[0], TIMES[0])
+    node.mark('student_0', SUBJECTS[0], DATES[0], TIMES[0])
+
+    rng = random.Random(node_id)
+    for _ in range(MARKS_PER_NODE):
+        node.mark(
+            f'student_{rng.randrange(ROSTER_SIZE)}', rng.choice(SUBJECTS),
+            rng.choice(DATES), rng.choice(TIMES)
+        )
+
+    # Publishing is finished everywhere once all nodes pass the barrier
+    barrier.wait()
+    node.catch_up(follower)
+    results.put((node_id, node.snapshot()))
+
+
+def run_late_node(feed_path, results):
+    node = Node('late', feed_path, tempfile.mkdtemp(prefix='late-'))
+    node.catch_up(node.follow())
+    results.put(('late', node.snapshot()))
+
+    # Losing the checkpoint replays everything again, which must change nothing
+    os.remove(node.checkpoint_path)
+    node.catch_up(node.follow())
+    results.put(('late-replayed', node.snapshot()))
+
+
+def expected_counters(snapshot):
+    counters = {
+        name: {subject: {'present': 0, 'total': 0} for subject in SUBJECTS}
+        for name in snapshot['registered']
+    }
+    for attendance_data in snapshot['files'].values():
+        for name, subjects in attendance_data.items():
+            if name not in counters:
+                continue
+            for subject in subjects:
+                counters[name][subject]['present'] += 1
+                counters[name][subject]['total'] += 1
+    return counters
+
+
+def main():
+    feed_path = os.path.join(tempfile.mkdtemp(), 'change_feed.db')
+    change_feed.init_feed(feed_path)
+    for i in range(ROSTER_SIZE):
+        roster_seq = change_feed.publish(feed_path, 'setup', 'register_face', {'user_id': f'student_{i}'})
+    barrier = multiprocessing.Barrier(NODES)
+    results = multiprocessing.Queue()
+
+    started = time.perf_counter()
+    processes = [
+        multiprocessing.Process(target=run_node, args=(f'node-{i}', feed_path, roster_seq, barrier, results))
+        for i in range(NODES)
+    ]
+    for process in processes:
+        process.start()
+    states = dict(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+
+    late = multiprocessing.Process(target=run_late_node, args=(feed_path, results))
+    late.start()
+    states.update(results.get() for _ in range(2))
+    late.join()
+    elapsed = time.perf_counter() - started
+
+    reference = states['node-0']
+    snapshot = json.loads(reference)
+    converged = all(state == reference for state in states.values())
+    counted = snapshot['counters'] == expected_counters(snapshot) and DELETED not in snapshot['counters']
+
+    print(f"{NODES} nodes + 1 late node, {change_feed.latest_seq(feed_path)} published changes in {elapsed:.1f}s")
+    print(f"{NODES * (MARKS_PER_NODE + 1)} marks attempted, "
+          f"{sum(c['present'] for s in snapshot['counters'].values() for c in s.values())} counted")
+    print("Converged" if converged else "DIVERGED")
+    print("Each (date, student, subject) counted once, deleted student stays deleted"
+          if counted else "COUNTS WRONG")
+    return 0 if converged and counted else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
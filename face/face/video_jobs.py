@@ -0,0 +1,188 @@
+# video_jobs.py - Background recognition jobs for uploaded classroom videos
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+
+# Shared pool that runs detection, encoding and matching on sampled frames
+FRAME_WORKERS = ThreadPoolExecutor(max_workers=os.cpu_count() or 2)
+MAX_FRAMES_IN_FLIGHT = 2 * (os.cpu_count() or 2)
+
+# Finished jobs stay pollable for this long before they are forgotten
+JOB_RETENTION_SECONDS = 3600
+
+FINISHED_STATUSES = ('completed', 'cancelled', 'failed')
+
+# Attendance is being written; from here on the job can no longer be cancelled
+MARKING_STATUS = 'marking'
+
+VIDEO_JOBS = {}
+_jobs_lock = threading.Lock()
+
+# Job fields that are internal and not returned to clients
+_PRIVATE_FIELDS = ('cancel_event', 'finished_at')
+
+
+def create_job(video_path, subject, stride, recognize_frame, on_complete):
+    """Register a job and start processing it in a background thread.
+
+    recognize_frame(rgb_image) returns the student ids found in a frame;
+    on_complete(first_seen) receives {student_id: seconds into the video}.
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'subject': subject,
+        'stride': stride,
+        'status': 'queued',
+        'frames_total': 0,
+        'frames_read': 0,
+        'frames_sampled': 0,
+        'first_seen': {},
+        'message': '',
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'cancel_event': threading.Event(),
+        'finished_at': None
+    }
+
+    with _jobs_lock:
+        _prune_jobs()
+        VIDEO_JOBS[job_id] = job
+
+    thread = threading.Thread(
+        target=_run_job,
+        args=(job, video_path, recognize_frame, on_complete),
+        daemon=True
+    )
+    thread.start()
+    return job_id
+
+
+def get_job(job_id):
+    """Return a JSON-safe snapshot of a job, or None if it does not exist"""
+    with _jobs_lock:
+        _prune_jobs()
+        job = VIDEO_JOBS.get(job_id)
+        if job is None:
+            return None
+        snapshot = {k: v for k, v in job.items() if k not in _PRIVATE_FIELDS}
+        snapshot['first_seen'] = dict(job['first_seen'])
+
+    total = snapshot['frames_total']
+    if snapshot['status'] == 'completed':
+        snapshot['progress'] = 100.0
+    else:
+        snapshot['progress'] = round(snapshot['frames_read'] / total * 100, 1) if total > 0 else 0.0
+    return snapshot
+
+
+def cancel_job(job_id):
+    """Request cancellation; returns False if the job is unknown, finished or already marking"""
+    with _jobs_lock:
+        job = VIDEO_JOBS.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES or job['status'] == MARKING_STATUS:
+            return False
+        job['cancel_event'].set()
+    return True
+
+
+def _prune_jobs():
+    """Forget jobs that finished more than JOB_RETENTION_SECONDS ago; call with _jobs_lock held"""
+    cutoff = time.monotonic() - JOB_RETENTION_SECONDS
+    expired = [
+        job_id for job_id, job in VIDEO_JOBS.items()
+        if job['finished_at'] is not None and job['finished_at'] < cutoff
+    ]
+    for job_id in expired:
+        del VIDEO_JOBS[job_id]
+
+
+def _update(job, **fields):
+    with _jobs_lock:
+        job.update(fields)
+        if job['status'] in FINISHED_STATUSES and job['finished_at'] is None:
+            job['finished_at'] = time.monotonic()
+
+
+def _cancel_pending(pending):
+    for _, future in pending:
+        future.cancel()
+    pending.clear()
+
+
+def _record(job, frame_time, student_ids):
+    with _jobs_lock:
+        for student_id in student_ids:
+            if student_id not in job['first_seen'] or frame_time < job['first_seen'][student_id]:
+                job['first_seen'][student_id] = frame_time
+
+
+def _run_job(job, video_path, recognize_frame, on_complete):
+    cancel_event = job['cancel_event']
+    pending = deque()
+    capture = cv2.VideoCapture(video_path)
+
+    try:
+        if not capture.isOpened():
+            _update(job, status='failed', message='Could not open video')
+            return
+
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        _update(job, status='running', frames_total=int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+
+        frame_index = 0
+        while not cancel_event.is_set():
+            ok, frame = capture.read()
+            if not ok:
+                break
+
+            if frame_index % job['stride'] == 0:
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frame_time = round(frame_index / fps, 2)
+                pending.append((frame_time, FRAME_WORKERS.submit(recognize_frame, rgb_frame)))
+                _update(job, frames_sampled=job['frames_sampled'] + 1)
+
+                # Keep decoding ahead of the workers without buffering the whole video
+                while len(pending) >= MAX_FRAMES_IN_FLIGHT:
+                    frame_time, future = pending.popleft()
+                    _record(job, frame_time, future.result())
+
+            frame_index += 1
+            _update(job, frames_read=frame_index)
+
+        while pending and not cancel_event.is_set():
+            frame_time, future = pending.popleft()
+            _record(job, frame_time, future.result())
+
+        # Check and leave the cancellable state together, so a cancel that
+        # cancel_job accepted is never followed by marking attendance
+        with _jobs_lock:
+            cancelled = cancel_event.is_set()
+            if not cancelled:
+                job['status'] = MARKING_STATUS
+                first_seen = dict(job['first_seen'])
+
+        if cancelled:
+            _cancel_pending(pending)
+            _update(job, status='cancelled', message='Job cancelled, no attendance was marked')
+            return
+
+        marked = on_complete(first_seen)
+        _update(job, status='completed', marked=marked,
+                message=f'Recognized {len(first_seen)} students')
+
+    except Exception as e:
+        print(f"Error in video job {job['id']}: {e}")
+        # Don't leave this job's remaining frames running in the shared pool
+        _cancel_pending(pending)
+        _update(job, status='failed', message=str(e))
+
+    finally:
+        capture.release()
+        if os.path.exists(video_path):
+            os.remove(video_path)